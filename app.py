@@ -2,36 +2,37 @@
 Main Streamlit application file for DevOptima.
 This is the final, stable version with all features and bug fixes.
 """
+import difflib
+import html
+import re
 import shutil
-import json
 import streamlit as st
-from streamlit_ace import st_ace
-from datetime import datetime
-from radon.complexity import cc_visit
-from radon.metrics import mi_visit, h_visit
-from radon.raw import analyze
-# Check if streamlit_code_diff is available in the original environment
+# orjson parses the simulation trace payloads several times faster than the
+# stdlib; fall back transparently when it is not installed.
 try:
-    from streamlit_code_diff import st_code_diff
+    from orjson import loads as json_loads
 except ImportError:
-    # Fallback if the user's environment didn't have it initially (though it was in the first read)
-    def st_code_diff(old_string, new_string, language='python'):
-        st.subheader("Original Code")
-        st.code(old_string, language=language)
-        st.subheader("Modified Code")
-        st.code(new_string, language=language)
+    from json import loads as json_loads
+from streamlit_ace import st_ace
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+# NOTE: radon is intentionally imported lazily inside the metric helpers
+# below. It is only needed after a button click, so keeping it out of the
+# module scope trims the cold-start import cost of every first load.
 
 # Import local modules
-from modules.llm_handler import call_groq_api
+from modules.llm_handler import call_groq_api, call_groq_api_batch, call_groq_api_stream, get_usage_summary
 from modules.agent_controller import autonomous_fix_loop
 from modules.prompt_templates import (
-    REFACTOR_PROMPT, OPTIMIZE_PROMPT, TRANSPILE_PROMPT, DEBUG_PROMPT, 
-    AUDIT_PROMPT, BATCH_FIX_PROMPT, SIMULATOR_PROMPT, PYTHON_TO_HINGLISH_PROMPT,
-    ASK_PROMPT
+    REFACTOR_PROMPT, OPTIMIZE_PROMPT, AUDIT_PROMPT, SIMULATOR_PROMPT,
+    PYTHON_TO_HINGLISH_PROMPT, DEBUG_PROMPT_TPL, BATCH_FIX_PROMPT_TPL,
+    ASK_PROMPT_TPL, TRANSPILE_PROMPT_TPL, MERGE_FIXES_PROMPT_TPL
 )
-from modules.diagram_gen import generate_mermaid_diagram, render_mermaid_diagram, generate_tree_data, render_tree_diagram
 from modules.code_parser import validate_python_code
 from utils.example_code import EXAMPLE_CODE
+from utils.fences import strip_fences
+from utils.minify import minify_for_llm
 from utils.style import get_css
 from utils.logger import setup_logger
 
@@ -40,74 +41,207 @@ logger = setup_logger("app")
 logger.info("DevOptima Application Starting...")
 
 # --- HELPER FUNCTIONS ---
-def get_system_info() -> str:
-    """Checks for GPU availability via nvidia-smi."""
-    if shutil.which("nvidia-smi"):
-        return "⚡ GPU Detected"
-    return "💻 CPU Mode"
+class _LLMError(Exception):
+    """Raised inside _cached_llm_inner so failures escape memoization."""
 
-def get_average_complexity(code: str) -> float:
-    """Calculates the average cyclomatic complexity of a code block."""
+@st.cache_data(ttl=3600, max_entries=64, show_spinner=False)
+def _cached_llm_inner(prompt: str, code: str, model_name: str) -> str:
+    # st.cache_data does not cache raised exceptions, so surfacing the
+    # API's 'ERROR: ...' sentinel as one keeps a transient failure (rate
+    # limit, network blip) from being replayed for up to an hour.
+    response = call_groq_api(prompt, code, model_name=model_name)
+    if response.startswith("ERROR:"):
+        raise _LLMError(response)
+    return response
+
+def _cached_llm(prompt: str, code: str, model_name: str) -> str:
+    """Memoized wrapper around the Groq call.
+
+    Identical (prompt, code, model) requests short-circuit to the cached
+    response, so reruns and repeat clicks never pay the network round-trip.
+    Only successful responses are memoized; error strings pass through
+    uncached so the next click retries.
+    """
     try:
-        blocks = cc_visit(code)
-        if not blocks: return 0.0
-        return sum(b.complexity for b in blocks) / len(blocks)
-    except Exception:
-        return 0.0
+        return _cached_llm_inner(prompt, code, model_name)
+    except _LLMError as e:
+        return str(e)
+
+def _stream_llm(prompt: str, code: str, model_name: str) -> str:
+    """Streams a Groq response into a live placeholder, returning full text.
+
+    Time-to-first-output drops from end-of-generation to first token; the
+    raw text is shown while it arrives and cleared once the caller renders
+    the parsed result. Shares the on-disk response cache with the blocking
+    path so repeat requests still skip the network entirely.
+    """
+    from modules import llm_cache
+    cache_key = llm_cache.make_key(prompt, code, model_name)
+    if (cached := llm_cache.get(cache_key)) is not None:
+        return cached
+    placeholder = st.empty()
+    chunks = []
+    # A mid-stream failure yields its error text after arbitrary partial
+    # output, so the response text alone cannot prove success; the stream
+    # flags any failure path in this dict.
+    status: dict = {}
+    for chunk in call_groq_api_stream(prompt, code, model_name=model_name, status=status):
+        chunks.append(chunk)
+        # Tail view: re-rendering a multi-KB blob per token would swamp the
+        # websocket; the last ~1500 chars keep the live feel cheaply.
+        placeholder.code("".join(chunks)[-1500:])
+    placeholder.empty()
+    response = "".join(chunks)
+    if not status.get("error") and response:
+        llm_cache.put(cache_key, response)
+    return response
+
+@st.cache_data(ttl=3600, max_entries=64, show_spinner=False)
+def _cached_mermaid_inner(code: str, diagram_type: str, model_name: str) -> str:
+    # diagram_gen drags in streamlit_mermaid/streamlit_echarts, so it is
+    # only imported once the Visualize tab is actually used.
+    from modules.diagram_gen import generate_mermaid_diagram
+    response = generate_mermaid_diagram(code, diagram_type, model_name=model_name)
+    if response.startswith("ERROR:"):
+        raise _LLMError(response)
+    return response
+
+def _cached_mermaid(code: str, diagram_type: str, model_name: str) -> str:
+    """Memoized wrapper around Mermaid diagram generation.
+
+    Same raise-through pattern as _cached_llm: the sequence path goes
+    through Groq, and a transient failure there must not be replayed
+    from the cache for an hour. Error strings pass through uncached so
+    the next click retries; render_mermaid_diagram handles them as is.
+    """
+    try:
+        return _cached_mermaid_inner(code, diagram_type, model_name)
+    except _LLMError as e:
+        return str(e)
+
+def _validated(code: str) -> str | None:
+    """Syntax validation; memoized by validate_python_code's own lru_cache."""
+    return validate_python_code(code)
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def _diff_html(old_string: str, new_string: str) -> str:
+    """Builds the before/after diff table server-side, cached on the pair."""
+    differ = difflib.HtmlDiff(wrapcolumn=80)
+    return differ.make_table(old_string.splitlines(), new_string.splitlines(), "Original", "Modified", context=True, numlines=3)
+
+def _code_diff(old_string: str, new_string: str, language: str = 'python') -> None:
+    """Renders a before/after diff computed once in Python with difflib.
+
+    Replaces the streamlit_code_diff component, which re-shipped both full
+    sources to the browser and re-diffed them in JS on every rerun; the
+    cached HTML blob is reused until either side changes.
+    """
+    st.markdown(_diff_html(old_string, new_string), unsafe_allow_html=True)
 
+# GPU presence cannot change during the process lifetime, so probe PATH for
+# nvidia-smi once at import instead of on every sidebar render.
+_SYSTEM_INFO = "⚡ GPU Detected" if shutil.which("nvidia-smi") else "💻 CPU Mode"
+
+# Display-only date for the sidebar caption, formatted once at startup
+# rather than on every rerun.
+_BUILD_DATE = datetime.now().strftime('%Y-%m-%d')
+
+def get_system_info() -> str:
+    """Returns the GPU/CPU badge computed once at startup."""
+    return _SYSTEM_INFO
+
+@st.cache_data(max_entries=128, ttl=600, show_spinner=False)
 def get_advanced_metrics(code: str) -> dict:
-    """Calculates advanced metrics using Radon."""
+    """Calculates advanced metrics using Radon.
+
+    Cached on the code string, with a per-session hash gate underneath so
+    repeat metric renders skip the three Radon AST passes even when the
+    Streamlit data cache is disabled or cold.
+    """
+    import ast
+    from radon.metrics import h_visit_ast, mi_compute
+    from radon.raw import analyze
+    from radon.visitors import ComplexityVisitor
+    metrics_cache = st.session_state.setdefault('metrics_cache', {})
+    code_hash = hash(code)
+    if code_hash in metrics_cache:
+        return metrics_cache[code_hash]
     try:
-        blocks = cc_visit(code)
+        # Parse once and feed the tree to both visitors: cc_visit/mi_visit/
+        # h_visit would each re-run ast.parse on the same source otherwise.
+        tree = ast.parse(code)
+        visitor = ComplexityVisitor.from_ast(tree)
+        blocks = visitor.blocks
         avg_cc = sum(b.complexity for b in blocks) / len(blocks) if blocks else 0
-        mi_score = mi_visit(code, multi=True)
-        h_metrics = h_visit(code)
+        h_metrics = h_visit_ast(tree)
         h_volume = h_metrics.total.volume if h_metrics else 0
-        return {"complexity": avg_cc, "maintainability": mi_score, "halstead_volume": h_volume}
+        # MI from the already-computed components (mi_visit equivalent with
+        # multi=True, which counts multiline strings as comments).
+        raw = analyze(code)
+        comments_pct = (raw.comments + raw.multi) / float(raw.sloc) * 100 if raw.sloc != 0 else 0
+        mi_score = mi_compute(h_volume, visitor.total_complexity, raw.lloc, comments_pct)
+        result = {"complexity": avg_cc, "maintainability": mi_score, "halstead_volume": h_volume}
     except Exception:
-        return {"complexity": 0, "maintainability": 0, "halstead_volume": 0}
+        result = {"complexity": 0, "maintainability": 0, "halstead_volume": 0}
+    metrics_cache[code_hash] = result
+    return result
 
+def get_average_complexity(code: str) -> float:
+    """Average cyclomatic complexity; shares the single cached cc_visit pass."""
+    return get_advanced_metrics(code)["complexity"]
+
+# All ---TAG--- delimiters the prompt templates can emit, tokenized in a
+# single linear scan instead of one `in` + `split` pass per candidate tag.
+_DELIM_RE = re.compile(r"---(DESCRIPTION|CODE|WARNING|SECURITY_SCORE|DEBT_GRADE|ANALYSIS|VERDICT|SIMULATION_DATA)---")
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
 def parse_custom_response(response_str: str) -> dict:
-    """Parses the custom delimiter format from the LLM."""
+    """Parses the custom delimiter format from the LLM.
+
+    Memoized so reruns re-displaying a stored response skip the splitting,
+    fence stripping, and json.loads work.
+    """
     data = {"description": "", "code": "", "warning": "", "security_score": "0", "debt_grade": "F", "analysis": "", "verdict": "", "simulation": None}
     text = response_str.replace('\r\n', '\n').strip()
-    if "---DESCRIPTION---" in text:
-        parts = text.split("---DESCRIPTION---", 1)
-        if len(parts) > 1:
-            content = parts[1]
-            if "---CODE---" in content:
-                desc, code = content.split("---CODE---", 1)
-                data["description"], data["code"] = desc.strip(), code.strip().replace("```python", "").replace("```", "").strip()
-            else: data["description"] = content.strip()
-    elif "---WARNING---" in text:
-        parts = text.split("---WARNING---", 1)
-        if len(parts) > 1:
-            content = parts[1]
-            if "---CODE---" in content:
-                warn, code = content.split("---CODE---", 1)
-                data["warning"], data["code"] = warn.strip(), code.strip().replace("```python", "").replace("```", "").strip()
-    elif "---SECURITY_SCORE---" in text:
+
+    # Tokenize every delimiter in one pass; the span between consecutive
+    # matches is that section's body. First occurrence of a tag wins.
+    matches = list(_DELIM_RE.finditer(text))
+    sections = {}
+    for index, match in enumerate(matches):
+        end = matches[index + 1].start() if index + 1 < len(matches) else len(text)
+        sections.setdefault(match.group(1), text[match.end():end])
+
+    if "DESCRIPTION" in sections:
+        data["description"] = sections["DESCRIPTION"].strip()
+        if "CODE" in sections:
+            data["code"] = strip_fences(sections["CODE"])
+    elif "WARNING" in sections:
+        data["warning"] = sections["WARNING"].strip()
+        if "CODE" in sections:
+            data["code"] = strip_fences(sections["CODE"])
+    elif "SECURITY_SCORE" in sections:
         try:
-            parts = text.split("---SECURITY_SCORE---")[1].split("---DEBT_GRADE---")
-            data["security_score"] = parts[0].strip()
-            parts2 = parts[1].split("---ANALYSIS---")
-            data["debt_grade"] = parts2[0].strip()
-            parts3 = parts2[1].split("---VERDICT---")
-            data["analysis"], data["verdict"] = parts3[0].strip(), parts3[1].strip()
-        except Exception: data["analysis"] = "Error parsing audit report."
-    elif "---SIMULATION_DATA---" in text:
+            data["security_score"] = sections["SECURITY_SCORE"].strip()
+            data["debt_grade"] = sections["DEBT_GRADE"].strip()
+            data["analysis"] = sections["ANALYSIS"].strip()
+            data["verdict"] = sections["VERDICT"].strip()
+        except KeyError:
+            data["analysis"] = "Error parsing audit report."
+    elif "SIMULATION_DATA" in sections:
         try:
-            json_str = text.split("---SIMULATION_DATA---")[1].strip().replace("```json", "").replace("```", "").strip()
-            data["simulation"] = json.loads(json_str)
+            data["simulation"] = json_loads(strip_fences(sections["SIMULATION_DATA"]))
         except Exception: pass
-    elif "---CODE---" in text:
-        data["code"] = text.split("---CODE---", 1)[1].strip().replace("```python", "").replace("```", "").strip()
+    elif "CODE" in sections:
+        data["code"] = strip_fences(sections["CODE"])
     elif "def " in text or "import " in text:
-        data["code"] = text.replace("```python", "").replace("```", "").strip()
+        data["code"] = strip_fences(text)
     return data
 
 # --- PAGE CONFIGURATION ---
 st.set_page_config(page_title="DevOptima", page_icon="🤖", layout="wide", initial_sidebar_state="collapsed")
+
 st.markdown(get_css(), unsafe_allow_html=True)
 
 # --- SIDEBAR ---
@@ -127,16 +261,28 @@ with st.sidebar:
         format_func=lambda x: model_options[x],
         index=0
     )
-    st.caption(f"v2.0.0 | {datetime.now().strftime('%Y-%m-%d')}")
+    st.caption(f"v2.0.0 | {_BUILD_DATE}")
+
+    usage = get_usage_summary()
+    if usage["prompt_tokens"]:
+        st.caption(f"Tokens: {usage['prompt_tokens']:,} in / {usage['completion_tokens']:,} out | Prompt cache: {usage['cache_hit_rate']:.0%}")
 
 # --- SESSION STATE ---
-if 'current_code' not in st.session_state: st.session_state.current_code = EXAMPLE_CODE
-if 'last_known_code' not in st.session_state: st.session_state.last_known_code = EXAMPLE_CODE
-if 'ask_chat_history' not in st.session_state: st.session_state.ask_chat_history = []
+st.session_state.setdefault('current_code', EXAMPLE_CODE)
+st.session_state.setdefault('last_known_code', EXAMPLE_CODE)
+# deque(maxlen) keeps chat history bounded with O(1) appends — no pop(0)
+# shifting and no ever-growing render loop in the ASK tab.
+if 'ask_chat_history' not in st.session_state: st.session_state.ask_chat_history = deque(maxlen=50)
+
+# Sources beyond this bloat session state (re-serialized every rerun) and
+# stall Radon's AST walkers, so reject them before decoding.
+MAX_UPLOAD_BYTES = 512 * 1024
 
-OUTPUT_KEYS = ['refactor_output', 'optimize_output', 'debug_output', 'transpile_output', 'audit_output', 'fix_output', 'simulator_output', 'hinglish_output']
-for key in OUTPUT_KEYS:
-    if key not in st.session_state: st.session_state[key] = None
+# All directive outputs live in one dict: one session-state entry to
+# initialize and a single assignment to bulk-reset when the code changes.
+OUTPUT_KEYS = ('refactor', 'optimize', 'debug', 'transpile', 'audit', 'fix', 'simulator', 'hinglish')
+if 'outputs' not in st.session_state:
+    st.session_state.outputs = dict.fromkeys(OUTPUT_KEYS)
 
 # --- UI HEADER ---
 st.markdown("""
@@ -150,219 +296,311 @@ st.markdown("""
     </div>
 """, unsafe_allow_html=True)
 
+# --- TAB FRAGMENTS ---
+# Heavy tab bodies run as st.fragment functions so their own widget events
+# (radio/selectbox changes, button clicks) rerun only the fragment instead of
+# the whole script — the Ace editor and the other tabs stay untouched.
+@st.fragment
+def _audit_tab(selected_model: str):
+    st.markdown('<div class="action-card card-audit"><div class="action-card-title">🛡️ Code Quality Audit</div><div class="action-card-desc">Deep-scan architecture for security risks, maintainability issues, and technical debt. Generates a comprehensive engineering verdict.</div></div>', unsafe_allow_html=True)
+    if st.button("Generate Audit Report", key="audit", use_container_width=True):
+        logger.info("Audit directive triggered.")
+        if not (err := _validated(st.session_state.current_code)):
+            with st.spinner("Executing deep scan..."):
+                # Run the Radon pass while the LLM round-trip is in flight
+                # instead of paying the two latencies back-to-back.
+                with ThreadPoolExecutor(max_workers=1) as pool:
+                    # The audit only analyses the code, so comments and blank
+                    # lines are dead weight in the prompt.
+                    ai_future = pool.submit(call_groq_api, AUDIT_PROMPT, minify_for_llm(st.session_state.current_code))
+                    metrics = get_advanced_metrics(st.session_state.current_code)
+                    parsed_ai = parse_custom_response(ai_future.result())
+                # Format the metric labels once at store time; reruns that
+                # redisplay the report then skip the float formatting.
+                metric_labels = (f"{metrics['maintainability']:.1f}", f"{metrics['complexity']:.2f}", f"{metrics['halstead_volume']:.0f}")
+                st.session_state.outputs['audit'] = {"complexity": metrics["complexity"], "maintainability": metrics["maintainability"], "halstead_volume": metrics["halstead_volume"], "metric_labels": metric_labels, **parsed_ai}
+                st.session_state.outputs['fix'] = None
+        else: st.error(err)
+    if st.session_state.outputs['audit']:
+        data = st.session_state.outputs['audit']
+        m1, m2, m3 = st.columns(3)
+        mi_label, cc_label, hv_label = data["metric_labels"]
+        m1.metric("Maintainability", mi_label)
+        m2.metric("Complexity", cc_label)
+        m3.metric("Halstead Vol.", hv_label)
+        st.info(f"🛡️ Security: **{data['security_score']}/100** | 🏗️ Debt Grade: **{data['debt_grade']}**")
+        st.warning(data["analysis"])
+        st.success(data["verdict"])
+        st.markdown("---")
+        # A form batches the four toggles with the submit: flipping a
+        # checkbox no longer triggers a rerun, only the button does.
+        with st.form("audit_fix_form", border=False):
+            c1, c2 = st.columns(2)
+            f_sec, f_sty = c1.checkbox("Fix Security", int(data.get('security_score', 100)) < 90), c1.checkbox("Fix Style", True)
+            f_doc, f_opt = c2.checkbox("Add Docs", True), c2.checkbox("Optimize", data.get('debt_grade') in ['C', 'D', 'F'])
+            apply_fixes = st.form_submit_button("Apply Selected Changes", use_container_width=True)
+        if apply_fixes:
+            fixes = []
+            if f_sec: fixes.append("- Fix security.")
+            if f_sty: fixes.append("- PEP-8 style.")
+            if f_doc: fixes.append("- Add docstrings/types.")
+            if f_opt: fixes.append("- Optimize logic.")
+            if fixes:
+                logger.info(f"Applying audit fixes: {', '.join(fixes)}")
+                with st.spinner("Applying fixes..."):
+                    if len(fixes) == 1:
+                        raw = _cached_llm(BATCH_FIX_PROMPT_TPL.substitute(selected_fixes=fixes[0]), st.session_state.current_code, selected_model)
+                    else:
+                        # One short call per fix runs in parallel, so the
+                        # wall-clock cost is max(calls) + the merge instead of
+                        # one long combined generation.
+                        variants = call_groq_api_batch(
+                            [(BATCH_FIX_PROMPT_TPL.substitute(selected_fixes=f), st.session_state.current_code) for f in fixes],
+                            model_name=selected_model,
+                        )
+                        blocks = "\n\n".join(
+                            f"--- VARIANT {i} ({fix.lstrip('- ').rstrip('.')}) ---\n{parse_custom_response(v)['code'] or v}"
+                            for i, (fix, v) in enumerate(zip(fixes, variants), 1)
+                        )
+                        raw = _cached_llm(MERGE_FIXES_PROMPT_TPL.substitute(variants=blocks), st.session_state.current_code, selected_model)
+                    st.session_state.outputs['fix'] = parse_custom_response(raw)
+        if st.session_state.outputs['fix']:
+            st.info(st.session_state.outputs['fix']["description"])
+            if st.session_state.outputs['fix']["code"]:
+                _code_diff(old_string=st.session_state.current_code, new_string=st.session_state.outputs['fix']["code"], language='python')
+            else:
+                st.warning("The AI returned no code to diff.")
+
+@st.fragment
+def _ask_tab(selected_model: str):
+    st.markdown('<div class="action-card card-refactor"><div class="action-card-title">💬 ASK — Code Reasoning</div><div class="action-card-desc">Ask natural language questions about your code. Read-only context-aware analysis.</div></div>', unsafe_allow_html=True)
+    
+    # Display chat history
+    for message in st.session_state.ask_chat_history:
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+
+    # Chat input
+    if prompt := st.chat_input("Ask a question about your code..."):
+        logger.info("ASK directive triggered.")
+        # Display user message
+        with st.chat_message("user"):
+            st.markdown(prompt)
+        st.session_state.ask_chat_history.append({"role": "user", "content": prompt})
+
+        # Generate response, streaming tokens into the chat bubble as
+        # they arrive instead of blocking on the full completion.
+        with st.chat_message("assistant"):
+            formatted_prompt = ASK_PROMPT_TPL.substitute(user_code=st.session_state.current_code, user_question=prompt)
+            response = st.write_stream(call_groq_api_stream(formatted_prompt, st.session_state.current_code, model_name=selected_model))
+        st.session_state.ask_chat_history.append({"role": "assistant", "content": response})
+
+@st.fragment
+def _linguistic_tab(selected_model: str):
+    st.markdown('<div class="action-card card-debug"><div class="action-card-title">🇮🇳 Linguistic Walkthrough</div><div class="action-card-desc">Generate a context-aware explanation in vernacular Hinglish for better conceptual clarity.</div></div>', unsafe_allow_html=True)
+    
+    # Slider for Tone Selection
+    tone_style = st.select_slider("Select Explanation Style:", options=["Professional (English)", "Conversational (Hinglish)", "Desi (Bhai Mode)"], value="Desi (Bhai Mode)")
+    
+    if st.button("Generate Walkthrough", key="hinglish", use_container_width=True):
+        logger.info(f"Linguistic directive triggered with tone: {tone_style}")
+        if not (err := _validated(st.session_state.current_code)):
+            with st.spinner("Generating Walkthrough..."):
+                # Dynamic Prompt Selection
+                if tone_style == "Professional (English)":
+                    custom_prompt = PYTHON_TO_HINGLISH_PROMPT.replace("Hinglish / Desi", "Professional Technical English").replace("Bhai", "Engineer").replace("Desi", "Formal")
+                elif tone_style == "Conversational (Hinglish)":
+                    custom_prompt = PYTHON_TO_HINGLISH_PROMPT.replace("Desi", "Conversational").replace("Bhai", "Friend")
+                else:
+                    custom_prompt = PYTHON_TO_HINGLISH_PROMPT # Default Desi
+
+                st.session_state.outputs['hinglish'] = parse_custom_response(_cached_llm(custom_prompt, st.session_state.current_code, selected_model))
+        else: st.error(err)
+    if hinglish_out := st.session_state.outputs['hinglish']:
+        st.info(hinglish_out["description"])
+        st.markdown(f'<div class="desi-box">{hinglish_out["code"]}</div>', unsafe_allow_html=True)
+
+@st.fragment
+def _simulate_tab(selected_model: str):
+    st.markdown('<div class="action-card card-simulate"><div class="action-card-title">🔮 Logic Simulation</div><div class="action-card-desc">Execute code in a virtual environment to visualize data flow and state changes without side effects. High-fidelity mental trace.</div></div>', unsafe_allow_html=True)
+    chaos = st.checkbox("🔥 Chaos Mode (Test Edge Cases)", False)
+    if st.button("Run Simulation", key="sim", use_container_width=True):
+        logger.info(f"Simulate directive triggered (Chaos: {chaos})")
+        if not (err := _validated(st.session_state.current_code)):
+            prompt = SIMULATOR_PROMPT.replace("SCENARIO:", "SCENARIO: CHAOS_MODE. Find edge cases.") if chaos else SIMULATOR_PROMPT
+            with st.spinner("Simulating execution..."):
+                st.session_state.outputs['simulator'] = parse_custom_response(_cached_llm(prompt, minify_for_llm(st.session_state.current_code), selected_model))
+        else: st.error(err)
+    if st.session_state.outputs['simulator'] and st.session_state.outputs['simulator'].get("simulation"):
+        sim = st.session_state.outputs['simulator']["simulation"]
+        st.caption(f"Scenario: {sim.get('scenario')} | {sim.get('complexity_note')}")
+        # One HTML table for the whole trace: a container + columns +
+        # widgets per step would cost N layout passes on every rerun.
+        rows = "".join(
+            f"<tr><td class='trace-step'>Step {html.escape(str(s.get('step', '')))}</td>"
+            f"<td><code>{html.escape(str(s.get('line', '')))}</code></td>"
+            f"<td>{html.escape(str(s.get('action', '')))}<br><code>{html.escape(str(s.get('variables', '')))}</code></td></tr>"
+            for s in sim.get("trace", [])
+        )
+        st.markdown(f"<table class='trace-table'>{rows}</table>", unsafe_allow_html=True)
+        st.success(sim.get("outcome"))
+
+@st.fragment
+def _debug_tab(selected_model: str):
+    st.markdown('<div class="action-card card-debug"><div class="action-card-title">🐞 Intelligent Debugger</div><div class="action-card-desc">Heal broken code instantly. Paste an error log or let the AI scan for hidden logic bugs and security leaks.</div></div>', unsafe_allow_html=True)
+    
+    c1, c2 = st.columns([3, 1])
+    with c1:
+        log = st.text_area("Paste Error/Traceback", height=100)
+    with c2:
+        st.markdown("<br>", unsafe_allow_html=True)
+        auto_mode = st.checkbox("🤖 Enable Autonomous Agent\n(Self-Healing Loop)", value=False, help="If enabled, the AI will write, validate, and fix its own code recursively until it passes syntax checks.")
+
+    if st.button("Run Debug Scan", key="debug", use_container_width=True):
+        logger.info(f"Debug directive triggered (Autonomous: {auto_mode})")
+        if not (err := _validated(st.session_state.current_code)):
+            formatted_prompt = DEBUG_PROMPT_TPL.substitute(error_log=log if log else "None")
+            with st.spinner("Diagnosing..."):
+                if auto_mode:
+                    raw_response = autonomous_fix_loop(formatted_prompt, st.session_state.current_code, "debugging", model_name=selected_model)
+                else:
+                    raw_response = _cached_llm(formatted_prompt, st.session_state.current_code, selected_model)
+                
+                st.session_state.outputs['debug'] = parse_custom_response(raw_response)
+        else: st.error(err)
+    if st.session_state.outputs['debug']:
+        st.warning(st.session_state.outputs['debug']["description"])
+        if st.session_state.outputs['debug']["code"]:
+            _code_diff(old_string=st.session_state.current_code, new_string=st.session_state.outputs['debug']["code"], language='python')
+
+@st.fragment
+def _visualize_tab(selected_model: str):
+    st.markdown('<div class="action-card card-simulate"><div class="action-card-title">🗺️ Architecture Visualization</div><div class="action-card-desc">Generate instant flowcharts, sequence diagrams, and interactive class maps from your code.</div></div>', unsafe_allow_html=True)
+
+    viz_type = st.radio("Select View:", ["Flowchart", "Sequence Diagram", "Interactive Code Map"], horizontal=True)
+
+    if st.button("Generate Visualization", key="gen_viz", use_container_width=True):
+        logger.info(f"Visualization directive triggered: {viz_type}")
+        if not (err := _validated(st.session_state.current_code)):
+            from modules.diagram_gen import generate_tree_data, render_tree_diagram, render_mermaid_diagram
+            with st.spinner("Analyzing architecture..."):
+                if viz_type == "Interactive Code Map":
+                    tree_data = generate_tree_data(st.session_state.current_code)
+                    render_tree_diagram(tree_data)
+                else:
+                    d_type = "sequence" if viz_type == "Sequence Diagram" else "flowchart"
+                    mermaid_code = _cached_mermaid(st.session_state.current_code, d_type, selected_model)
+                    render_mermaid_diagram(mermaid_code)
+        else: st.error(err)
+
+@st.fragment
+def _refactor_tab(selected_model: str):
+    st.markdown('<div class="action-card card-refactor"><div class="action-card-title">🛠️ Code Refactoring</div><div class="action-card-desc">Modernize code for PEP-8 compliance. Inject type hints, Google-style docstrings, and improve modularity.</div></div>', unsafe_allow_html=True)
+    if st.button("Execute Refactor", key="refactor", use_container_width=True):
+        logger.info("Refactor directive triggered.")
+        if not (err := _validated(st.session_state.current_code)):
+            with st.spinner("Refactoring..."):
+                st.session_state.outputs['refactor'] = parse_custom_response(_stream_llm(REFACTOR_PROMPT, st.session_state.current_code, selected_model))
+        else: st.error(err)
+    if st.session_state.outputs['refactor']:
+        st.info(st.session_state.outputs['refactor']["description"])
+        if st.session_state.outputs['refactor']["code"]:
+            _code_diff(old_string=st.session_state.current_code, new_string=st.session_state.outputs['refactor']["code"], language='python')
+        else:
+            st.warning("The AI returned no code to diff.")
+
+@st.fragment
+def _optimize_tab(selected_model: str):
+    st.markdown('<div class="action-card card-optimize"><div class="action-card-title">🚀 Performance Optimization</div><div class="action-card-desc">Identify algorithmic bottlenecks. Replace inefficient loops with high-performance vectorization or better Big-O alternatives.</div></div>', unsafe_allow_html=True)
+    if st.button("Execute Optimize", key="optimize", use_container_width=True):
+        logger.info("Optimize directive triggered.")
+        if not (err := _validated(st.session_state.current_code)):
+            with st.spinner("Optimizing..."):
+                st.session_state.outputs['optimize'] = parse_custom_response(_stream_llm(OPTIMIZE_PROMPT, st.session_state.current_code, selected_model))
+        else: st.error(err)
+    if st.session_state.outputs['optimize']:
+        st.info(st.session_state.outputs['optimize']["description"])
+        if st.session_state.outputs['optimize']["code"]:
+            _code_diff(old_string=st.session_state.current_code, new_string=st.session_state.outputs['optimize']["code"], language='python')
+        else:
+            st.warning("The AI returned no code to diff.")
+
+@st.fragment
+def _transpile_tab(selected_model: str):
+    st.markdown('<div class="action-card card-transpile"><div class="action-card-title">🌐 Code Transpilation</div><div class="action-card-desc">Seamlessly translate Python to production languages like Rust, Go, or TypeScript while maintaining logic parity.</div></div>', unsafe_allow_html=True)
+    lang = st.selectbox("Target Language", ["Rust", "JavaScript", "Go", "C++", "Java", "TypeScript", "Swift", "Kotlin"])
+    if st.button(f"Transpile to {lang}", key="trans", use_container_width=True):
+        logger.info(f"Transpile directive triggered: Python to {lang}")
+        if not (err := _validated(st.session_state.current_code)):
+            with st.spinner("Transpiling..."):
+                st.session_state.outputs['transpile'] = parse_custom_response(_cached_llm(TRANSPILE_PROMPT_TPL.substitute(target_lang=lang), st.session_state.current_code, selected_model))
+        else: st.error(err)
+    if st.session_state.outputs['transpile']:
+        if st.session_state.outputs['transpile']["warning"]: st.warning(st.session_state.outputs['transpile']["warning"])
+        if st.session_state.outputs['transpile']["code"]:
+            st.code(st.session_state.outputs['transpile']["code"], language=lang.lower())
+
 col1, col2 = st.columns((1, 1), gap="large")
 
-with col1:
+@st.fragment
+def _editor_workspace():
+    """Editor column as a fragment: uploads and edits rerun only this block,
+    so the heavy Ace component is not remounted by events elsewhere."""
     st.markdown("### 💻 Code Workspace")
     if uploaded_file := st.file_uploader("Upload Python Source", type="py"):
-        logger.info(f"New file uploaded: {uploaded_file.name}")
-        st.session_state.current_code = uploaded_file.getvalue().decode("utf-8")
-    
+        if uploaded_file.size > MAX_UPLOAD_BYTES:
+            st.error(f"File exceeds the {MAX_UPLOAD_BYTES // 1024} KB limit. Please upload a smaller source file.")
+        else:
+            logger.info(f"New file uploaded: {uploaded_file.name}")
+            st.session_state.current_code = uploaded_file.getvalue().decode("utf-8")
+
     # Editor
-    code_input = st_ace(value=st.session_state.current_code, language="python", theme="vibrant_ink", keybinding="vscode", font_size=14, height=500, wrap=True)
-    
+    # auto_update=False debounces the editor: the value only comes back on an
+    # explicit apply (Ctrl+Enter), not per keystroke, so typing never reruns
+    # the script. Made explicit here since the whole app depends on it.
+    code_input = st_ace(value=st.session_state.current_code, language="python", theme="vibrant_ink", keybinding="vscode", font_size=14, height=500, wrap=True, auto_update=False)
+
     # Stale Result Detection
     if code_input != st.session_state.last_known_code:
         st.session_state.last_known_code = code_input
         st.session_state.current_code = code_input
         # Clear all AI outputs since the code has changed
-        for key in OUTPUT_KEYS:
-            st.session_state[key] = None
-        st.rerun() # Force a rerun to update the UI immediately
-    
+        st.session_state.outputs = dict.fromkeys(OUTPUT_KEYS)
+        st.rerun(scope="app") # Full rerun so stale outputs in the other column clear
+
     st.session_state.current_code = code_input
 
+with col1:
+    _editor_workspace()
+
 with col2:
     st.markdown("### ⚡ AI Directives")
     
     tabs = st.tabs(["🛡️ AUDIT", "🗺️ VISUALIZE", "💬 ASK", "🇮🇳 LINGUISTIC", "🔮 SIMULATE", "🐞 DEBUG", "🛠️ REFACTOR", "🚀 OPTIMIZE", "🌐 TRANSPILE"])
 
     with tabs[0]: # Audit
-        st.markdown('<div class="action-card card-audit"><div class="action-card-title">🛡️ Code Quality Audit</div><div class="action-card-desc">Deep-scan architecture for security risks, maintainability issues, and technical debt. Generates a comprehensive engineering verdict.</div></div>', unsafe_allow_html=True)
-        if st.button("Generate Audit Report", key="audit", use_container_width=True):
-            logger.info("Audit directive triggered.")
-            if not (err := validate_python_code(st.session_state.current_code)):
-                with st.spinner("Executing deep scan..."):
-                    metrics = get_advanced_metrics(st.session_state.current_code)
-                    parsed_ai = parse_custom_response(call_groq_api(AUDIT_PROMPT, st.session_state.current_code))
-                    st.session_state.audit_output = {"complexity": metrics["complexity"], "maintainability": metrics["maintainability"], "halstead_volume": metrics["halstead_volume"], **parsed_ai}
-                    st.session_state.fix_output = None
-            else: st.error(err)
-        if st.session_state.audit_output:
-            data = st.session_state.audit_output
-            m1, m2, m3 = st.columns(3)
-            m1.metric("Maintainability", f"{data['maintainability']:.1f}")
-            m2.metric("Complexity", f"{data['complexity']:.2f}")
-            m3.metric("Halstead Vol.", f"{data['halstead_volume']:.0f}")
-            st.info(f"🛡️ Security: **{data['security_score']}/100** | 🏗️ Debt Grade: **{data['debt_grade']}**")
-            st.warning(data["analysis"])
-            st.success(data["verdict"])
-            st.markdown("---")
-            c1, c2 = st.columns(2)
-            f_sec, f_sty = c1.checkbox("Fix Security", int(data.get('security_score', 100)) < 90), c1.checkbox("Fix Style", True)
-            f_doc, f_opt = c2.checkbox("Add Docs", True), c2.checkbox("Optimize", data.get('debt_grade') in ['C', 'D', 'F'])
-            if st.button("Apply Selected Changes", key="apply_audit", use_container_width=True):
-                fixes = []
-                if f_sec: fixes.append("- Fix security.")
-                if f_sty: fixes.append("- PEP-8 style.")
-                if f_doc: fixes.append("- Add docstrings/types.")
-                if f_opt: fixes.append("- Optimize logic.")
-                if fixes:
-                    logger.info(f"Applying audit fixes: {', '.join(fixes)}")
-                    with st.spinner("Applying fixes..."):
-                        st.session_state.fix_output = parse_custom_response(call_groq_api(BATCH_FIX_PROMPT.replace("{selected_fixes}", "\n".join(fixes)), st.session_state.current_code, model_name=selected_model))
-            if st.session_state.fix_output:
-                st.info(st.session_state.fix_output["description"])
-                st_code_diff(old_string=st.session_state.current_code, new_string=st.session_state.fix_output["code"], language='python')
+        _audit_tab(selected_model)
 
     with tabs[1]: # Visualize
-        st.markdown('<div class="action-card card-simulate"><div class="action-card-title">🗺️ Architecture Visualization</div><div class="action-card-desc">Generate instant flowcharts, sequence diagrams, and interactive class maps from your code.</div></div>', unsafe_allow_html=True)
-        
-        viz_type = st.radio("Select View:", ["Flowchart", "Sequence Diagram", "Interactive Code Map"], horizontal=True)
-        
-        if st.button("Generate Visualization", key="gen_viz", use_container_width=True):
-            logger.info(f"Visualization directive triggered: {viz_type}")
-            if not (err := validate_python_code(st.session_state.current_code)):
-                with st.spinner("Analyzing architecture..."):
-                    if viz_type == "Interactive Code Map":
-                        tree_data = generate_tree_data(st.session_state.current_code, model_name=selected_model)
-                        render_tree_diagram(tree_data)
-                    else:
-                        d_type = "sequence" if viz_type == "Sequence Diagram" else "flowchart"
-                        mermaid_code = generate_mermaid_diagram(st.session_state.current_code, d_type, model_name=selected_model)
-                        render_mermaid_diagram(mermaid_code)
-            else: st.error(err)
+        _visualize_tab(selected_model)
 
     with tabs[2]: # ASK
-        st.markdown('<div class="action-card card-refactor"><div class="action-card-title">💬 ASK — Code Reasoning</div><div class="action-card-desc">Ask natural language questions about your code. Read-only context-aware analysis.</div></div>', unsafe_allow_html=True)
-        
-        # Display chat history
-        for message in st.session_state.ask_chat_history:
-            with st.chat_message(message["role"]):
-                st.markdown(message["content"])
-
-        # Chat input
-        if prompt := st.chat_input("Ask a question about your code..."):
-            logger.info("ASK directive triggered.")
-            # Display user message
-            with st.chat_message("user"):
-                st.markdown(prompt)
-            st.session_state.ask_chat_history.append({"role": "user", "content": prompt})
-
-            # Generate response
-            with st.chat_message("assistant"):
-                with st.spinner("Thinking..."):
-                    formatted_prompt = ASK_PROMPT.replace("{user_code}", st.session_state.current_code).replace("{user_question}", prompt)
-                    response = call_groq_api(formatted_prompt, st.session_state.current_code, model_name=selected_model)
-                    st.markdown(response)
-            st.session_state.ask_chat_history.append({"role": "assistant", "content": response})
+        _ask_tab(selected_model)
 
     with tabs[3]: # Linguistic
-        st.markdown('<div class="action-card card-debug"><div class="action-card-title">🇮🇳 Linguistic Walkthrough</div><div class="action-card-desc">Generate a context-aware explanation in vernacular Hinglish for better conceptual clarity.</div></div>', unsafe_allow_html=True)
-        
-        # Slider for Tone Selection
-        tone_style = st.select_slider("Select Explanation Style:", options=["Professional (English)", "Conversational (Hinglish)", "Desi (Bhai Mode)"], value="Desi (Bhai Mode)")
-        
-        if st.button("Generate Walkthrough", key="hinglish", use_container_width=True):
-            logger.info(f"Linguistic directive triggered with tone: {tone_style}")
-            if not (err := validate_python_code(st.session_state.current_code)):
-                with st.spinner("Generating Walkthrough..."):
-                    # Dynamic Prompt Selection
-                    if tone_style == "Professional (English)":
-                        custom_prompt = PYTHON_TO_HINGLISH_PROMPT.replace("Hinglish / Desi", "Professional Technical English").replace("Bhai", "Engineer").replace("Desi", "Formal")
-                    elif tone_style == "Conversational (Hinglish)":
-                        custom_prompt = PYTHON_TO_HINGLISH_PROMPT.replace("Desi", "Conversational").replace("Bhai", "Friend")
-                    else:
-                        custom_prompt = PYTHON_TO_HINGLISH_PROMPT # Default Desi
-
-                    st.session_state.hinglish_output = parse_custom_response(call_groq_api(custom_prompt, st.session_state.current_code, model_name=selected_model))
-            else: st.error(err)
-        if st.session_state.hinglish_output:
-            st.info(st.session_state.hinglish_output["description"])
-            st.markdown(f'<div class="desi-box">{st.session_state.hinglish_output["code"]}</div>', unsafe_allow_html=True)
+        _linguistic_tab(selected_model)
 
     with tabs[4]: # Simulate
-        st.markdown('<div class="action-card card-simulate"><div class="action-card-title">🔮 Logic Simulation</div><div class="action-card-desc">Execute code in a virtual environment to visualize data flow and state changes without side effects. High-fidelity mental trace.</div></div>', unsafe_allow_html=True)
-        chaos = st.checkbox("🔥 Chaos Mode (Test Edge Cases)", False)
-        if st.button("Run Simulation", key="sim", use_container_width=True):
-            logger.info(f"Simulate directive triggered (Chaos: {chaos})")
-            if not (err := validate_python_code(st.session_state.current_code)):
-                prompt = SIMULATOR_PROMPT.replace("SCENARIO:", "SCENARIO: CHAOS_MODE. Find edge cases.") if chaos else SIMULATOR_PROMPT
-                with st.spinner("Simulating execution..."):
-                    st.session_state.simulator_output = parse_custom_response(call_groq_api(prompt, st.session_state.current_code, model_name=selected_model))
-            else: st.error(err)
-        if st.session_state.simulator_output and st.session_state.simulator_output.get("simulation"):
-            sim = st.session_state.simulator_output["simulation"]
-            st.caption(f"Scenario: {sim.get('scenario')} | {sim.get('complexity_note')}")
-            for s in sim.get("trace", []):
-                with st.container():
-                    c1, c2 = st.columns([1, 4])
-                    c1.markdown(f"**Step {s.get('step')}**")
-                    c2.code(s.get('line'), language='python')
-                    st.caption(f"Action: {s.get('action')} | State: {s.get('variables')}")
-                    st.divider()
-            st.success(sim.get("outcome"))
+        _simulate_tab(selected_model)
 
     with tabs[5]: # Debug
-        st.markdown('<div class="action-card card-debug"><div class="action-card-title">🐞 Intelligent Debugger</div><div class="action-card-desc">Heal broken code instantly. Paste an error log or let the AI scan for hidden logic bugs and security leaks.</div></div>', unsafe_allow_html=True)
-        
-        c1, c2 = st.columns([3, 1])
-        with c1:
-            log = st.text_area("Paste Error/Traceback", height=100)
-        with c2:
-            st.markdown("<br>", unsafe_allow_html=True)
-            auto_mode = st.checkbox("🤖 Enable Autonomous Agent\n(Self-Healing Loop)", value=False, help="If enabled, the AI will write, validate, and fix its own code recursively until it passes syntax checks.")
-
-        if st.button("Run Debug Scan", key="debug", use_container_width=True):
-            logger.info(f"Debug directive triggered (Autonomous: {auto_mode})")
-            if not (err := validate_python_code(st.session_state.current_code)):
-                formatted_prompt = DEBUG_PROMPT.replace("{error_log}", log if log else "None")
-                with st.spinner("Diagnosing..."):
-                    if auto_mode:
-                        raw_response = autonomous_fix_loop(formatted_prompt, st.session_state.current_code, "debugging", model_name=selected_model)
-                    else:
-                        raw_response = call_groq_api(formatted_prompt, st.session_state.current_code, model_name=selected_model)
-                    
-                    st.session_state.debug_output = parse_custom_response(raw_response)
-            else: st.error(err)
-        if st.session_state.debug_output:
-            st.warning(st.session_state.debug_output["description"])
-            if st.session_state.debug_output["code"]:
-                st_code_diff(old_string=st.session_state.current_code, new_string=st.session_state.debug_output["code"], language='python')
+        _debug_tab(selected_model)
 
     with tabs[6]: # Refactor
-        st.markdown('<div class="action-card card-refactor"><div class="action-card-title">🛠️ Code Refactoring</div><div class="action-card-desc">Modernize code for PEP-8 compliance. Inject type hints, Google-style docstrings, and improve modularity.</div></div>', unsafe_allow_html=True)
-        if st.button("Execute Refactor", key="refactor", use_container_width=True):
-            logger.info("Refactor directive triggered.")
-            if not (err := validate_python_code(st.session_state.current_code)):
-                with st.spinner("Refactoring..."):
-                    st.session_state.refactor_output = parse_custom_response(call_groq_api(REFACTOR_PROMPT, st.session_state.current_code, model_name=selected_model))
-            else: st.error(err)
-        if st.session_state.refactor_output:
-            st.info(st.session_state.refactor_output["description"])
-            st_code_diff(old_string=st.session_state.current_code, new_string=st.session_state.refactor_output["code"], language='python')
+        _refactor_tab(selected_model)
 
     with tabs[7]: # Optimize
-        st.markdown('<div class="action-card card-optimize"><div class="action-card-title">🚀 Performance Optimization</div><div class="action-card-desc">Identify algorithmic bottlenecks. Replace inefficient loops with high-performance vectorization or better Big-O alternatives.</div></div>', unsafe_allow_html=True)
-        if st.button("Execute Optimize", key="optimize", use_container_width=True):
-            logger.info("Optimize directive triggered.")
-            if not (err := validate_python_code(st.session_state.current_code)):
-                with st.spinner("Optimizing..."):
-                    st.session_state.optimize_output = parse_custom_response(call_groq_api(OPTIMIZE_PROMPT, st.session_state.current_code, model_name=selected_model))
-            else: st.error(err)
-        if st.session_state.optimize_output:
-            st.info(st.session_state.optimize_output["description"])
-            st_code_diff(old_string=st.session_state.current_code, new_string=st.session_state.optimize_output["code"], language='python')
+        _optimize_tab(selected_model)
 
     with tabs[8]: # Transpile
-        st.markdown('<div class="action-card card-transpile"><div class="action-card-title">🌐 Code Transpilation</div><div class="action-card-desc">Seamlessly translate Python to production languages like Rust, Go, or TypeScript while maintaining logic parity.</div></div>', unsafe_allow_html=True)
-        lang = st.selectbox("Target Language", ["Rust", "JavaScript", "Go", "C++", "Java", "TypeScript", "Swift", "Kotlin"])
-        if st.button(f"Transpile to {lang}", key="trans", use_container_width=True):
-            logger.info(f"Transpile directive triggered: Python to {lang}")
-            if not (err := validate_python_code(st.session_state.current_code)):
-                with st.spinner("Transpiling..."):
-                    st.session_state.transpile_output = parse_custom_response(call_groq_api(f"TARGET LANGUAGE: {lang}\n\n{TRANSPILE_PROMPT}", st.session_state.current_code, model_name=selected_model))
-            else: st.error(err)
-        if st.session_state.transpile_output:
-            if st.session_state.transpile_output["warning"]: st.warning(st.session_state.transpile_output["warning"])
-            st.code(st.session_state.transpile_output["code"], language=lang.lower())
+        _transpile_tab(selected_model)
@@ -7,7 +7,8 @@ and the Code Parser (Validator).
 import streamlit as st
 from modules.llm_handler import call_groq_api
 from modules.code_parser import validate_python_code
-from modules.prompt_templates import SELF_CORRECTION_PROMPT
+from modules.prompt_templates import SELF_CORRECTION_PROMPT_TPL
+from utils.fences import strip_fences
 from utils.logger import setup_logger
 
 # Initialize logger
@@ -16,18 +17,19 @@ logger = setup_logger("agent_controller")
 MAX_ATTEMPTS = 3
 
 def parse_code_from_response(response_str: str) -> str:
-    """Extracts code from the LLM response format."""
-    code = ""
-    if "---CODE---" in response_str:
-        code = response_str.split("---CODE---", 1)[1].strip()
-    elif "```python" in response_str:
-        code = response_str.split("```python")[1].split("```")[0].strip()
-    elif "def " in response_str or "import " in response_str:
-        code = response_str.strip()
+    """Extracts code from the LLM response format.
+
+    Uses str.partition so each probe is a single scan returning slices,
+    instead of an `in` check followed by a list-allocating split.
+    """
+    _, sep, tail = response_str.partition("---CODE---")
+    if sep:
+        code = tail
     else:
-        code = response_str.strip()
-    
-    return code.replace("```python", "").replace("```", "").strip()
+        _, sep, tail = response_str.partition("```python")
+        code = tail.partition("```")[0] if sep else response_str
+
+    return strip_fences(code)
 
 def autonomous_fix_loop(initial_prompt: str, user_code: str, usage_description: str = "generating code", model_name: str = "llama-3.3-70b-versatile") -> str:
     """
@@ -43,8 +45,10 @@ def autonomous_fix_loop(initial_prompt: str, user_code: str, usage_description:
     
     current_prompt = initial_prompt
     last_response = ""
+    prev_code = None
+    prev_error = None
     logger.info(f"Starting autonomous fix loop for {usage_description}")
-    
+
     for attempt in range(1, MAX_ATTEMPTS + 1):
         # 1. Generate (or Regenerate)
         if attempt > 1:
@@ -70,12 +74,20 @@ def autonomous_fix_loop(initial_prompt: str, user_code: str, usage_description:
             
         # FAILURE: Prepare for next iteration
         logger.warning(f"Validation failed on attempt {attempt}: {error_msg}")
-        
+
+        # Convergence guard: if the model returned the same code or hit
+        # the exact same error again, another round-trip will not help —
+        # bail out now instead of burning the remaining 2s network calls.
+        if generated_code == prev_code or error_msg == prev_error:
+            logger.warning("Fix loop is not converging; aborting early.")
+            st.warning("⚠️ Model is not converging on a fix; stopping early.")
+            break
+        prev_code, prev_error = generated_code, error_msg
+
         # Update prompt for next loop
-        current_prompt = SELF_CORRECTION_PROMPT.replace(
-            "{previous_code}", generated_code
-        ).replace(
-            "{error_message}", error_msg
+        current_prompt = SELF_CORRECTION_PROMPT_TPL.substitute(
+            previous_code=generated_code,
+            error_message=error_msg,
         )
         
         # The 'user_code' for the correction prompt is actually irrelevant 
@@ -2,78 +2,223 @@
 Handles the generation and rendering of architecture diagrams and hierarchical trees.
 """
 
+import ast
+from functools import lru_cache
 import streamlit as st
-import json
-from streamlit_mermaid import st_mermaid
-from streamlit_echarts import st_echarts
+# streamlit_mermaid and streamlit_echarts are imported inside the render
+# functions: app.py defers importing this module until the Visualize tab
+# is used, and a session that only ever draws one diagram type should not
+# pay for the other component's vendor payload either.
 from modules.llm_handler import call_groq_api
-from modules.prompt_templates import DIAGRAM_PROMPT, TREE_PROMPT, SEQUENCE_PROMPT
+from modules.prompt_templates import SEQUENCE_PROMPT
+from utils.fences import strip_fences
 from utils.logger import setup_logger
 
 logger = setup_logger("diagram_gen")
 
+@lru_cache(maxsize=32)
+def _parse(python_code: str) -> ast.Module:
+    """One shared, memoized parse per unique source.
+
+    Generating a flowchart and the code map for the same buffer would
+    otherwise parse the identical text twice; st.cache_data is not used
+    here because the callers mutate nothing and an lru_cache avoids
+    pickling the tree.
+    """
+    return ast.parse(python_code)
+
+class _FlowchartEmitter:
+    """Emits simple Mermaid flowchart (graph TD) syntax from the AST.
+
+    Statements become rectangular nodes, If/For/While become decision
+    nodes with labelled branches, and Return terminates a path. Node IDs
+    are a running counter so the output is deterministic and cacheable.
+    """
+
+    _MAX_LABEL = 40
+
+    def __init__(self):
+        self.lines = ["graph TD"]
+        self._count = 0
+
+    def _new_id(self) -> str:
+        self._count += 1
+        return f"n{self._count}"
+
+    def _label(self, source) -> str:
+        """Builds a node label from an AST node or a plain string.
+
+        Labels are always emitted double-quoted, which lets Mermaid accept
+        brackets, parens, and braces in the text verbatim — only the quote
+        character itself needs neutralizing.
+        """
+        if isinstance(source, ast.AST):
+            try:
+                text = ast.unparse(source).partition("\n")[0]
+            except Exception:
+                text = type(source).__name__
+        else:
+            text = source
+        if len(text) > self._MAX_LABEL:
+            text = text[:self._MAX_LABEL - 3] + "..."
+        return text.replace('"', "'")
+
+    def _connect(self, preds: list, node_id: str):
+        for pred_id, edge_label in preds:
+            if edge_label:
+                self.lines.append(f"{pred_id} -->|{edge_label}| {node_id}")
+            else:
+                self.lines.append(f"{pred_id} --> {node_id}")
+
+    def emit_body(self, body: list, preds: list) -> list:
+        """Emits a statement list; returns the open (id, edge_label) exits."""
+        for stmt in body:
+            if isinstance(stmt, ast.If):
+                nid = self._new_id()
+                self.lines.append(f'{nid}{{"{self._label(stmt.test)}"}}')
+                self._connect(preds, nid)
+                exits = self.emit_body(stmt.body, [(nid, "Yes")])
+                if stmt.orelse:
+                    exits += self.emit_body(stmt.orelse, [(nid, "No")])
+                else:
+                    exits.append((nid, "No"))
+                preds = exits
+            elif isinstance(stmt, (ast.For, ast.AsyncFor, ast.While)):
+                nid = self._new_id()
+                self.lines.append(f'{nid}{{"{self._label(stmt)}"}}')
+                self._connect(preds, nid)
+                # The loop body feeds back into the loop head.
+                self._connect(self.emit_body(stmt.body, [(nid, "Loop")]), nid)
+                preds = [(nid, "Done")]
+            elif isinstance(stmt, ast.Return):
+                nid = self._new_id()
+                self.lines.append(f'{nid}("{self._label(stmt)}")')
+                self._connect(preds, nid)
+                preds = []
+            elif isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                nid = self._new_id()
+                args = ", ".join(arg.arg for arg in stmt.args.args)
+                label = self._label(f"{stmt.name}({args})")
+                self.lines.append(f'{nid}(["{label}"])')
+                self._connect(preds, nid)
+                preds = self.emit_body(stmt.body, [(nid, None)])
+            elif isinstance(stmt, ast.ClassDef):
+                nid = self._new_id()
+                label = self._label(f"class {stmt.name}")
+                self.lines.append(f'{nid}(["{label}"])')
+                self._connect(preds, nid)
+                preds = self.emit_body(stmt.body, [(nid, None)])
+            else:
+                nid = self._new_id()
+                self.lines.append(f'{nid}["{self._label(stmt)}"]')
+                self._connect(preds, nid)
+                preds = [(nid, None)]
+        return preds
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _local_flowchart(python_code: str) -> str:
+    """Builds the flowchart Mermaid syntax locally from the AST."""
+    try:
+        tree = _parse(python_code)
+    except SyntaxError as e:
+        return f"ERROR: Cannot build a flowchart from invalid code ({e.msg} on line {e.lineno})."
+    emitter = _FlowchartEmitter()
+    emitter.emit_body(tree.body, [])
+    return "\n".join(emitter.lines)
+
 def generate_mermaid_diagram(python_code: str, diagram_type: str = "flowchart", model_name: str = "llama-3.3-70b-versatile") -> str:
     """
     Generates a Mermaid.js diagram syntax.
     diagram_type can be 'flowchart' or 'sequence'.
+
+    Flowcharts are a deterministic control-flow projection, so they are
+    emitted locally from the AST. Sequence diagrams genuinely need
+    inference (actors, message intent) and still go through Groq.
     """
     if not python_code.strip():
         logger.warning("Attempted to generate Mermaid diagram from empty code.")
         return "ERROR: Cannot generate diagram from empty code."
-    
+
     logger.info(f"Generating Mermaid {diagram_type} diagram...")
-    prompt = SEQUENCE_PROMPT if diagram_type == "sequence" else DIAGRAM_PROMPT
-    mermaid_syntax = call_groq_api(prompt, python_code, model_name=model_name)
-    return mermaid_syntax
+    if diagram_type == "sequence":
+        return call_groq_api(SEQUENCE_PROMPT, python_code, model_name=model_name)
+    return _local_flowchart(python_code)
 
 def render_mermaid_diagram(mermaid_code: str):
     """Renders a Mermaid.js diagram."""
-    clean_code = mermaid_code.replace("```mermaid", "").replace("```", "").strip()
-    if "ERROR:" in mermaid_code or not clean_code:
+    clean_code = strip_fences(mermaid_code)
+    # startswith, not substring: user code containing the literal
+    # "ERROR:" flows verbatim into flowchart labels.
+    if mermaid_code.startswith("ERROR:") or not clean_code:
         logger.error(f"Mermaid rendering failed: {mermaid_code}")
         st.error(f"Could not generate the architecture diagram. Details: {mermaid_code}")
     else:
         logger.info("Rendering Mermaid diagram.")
+        from streamlit_mermaid import st_mermaid
         st.subheader("Generated Diagram")
         with st.container(border=True):
             st_mermaid(clean_code, height="600px")
 
-def generate_tree_data(python_code: str, model_name: str = "llama-3.3-70b-versatile") -> dict:
-    """Generates Hierarchical JSON data for the ECharts tree."""
+class _TreeBuilder(ast.NodeVisitor):
+    """Builds the ECharts hierarchy dict (module -> classes -> functions)."""
+
+    def __init__(self, root_name: str):
+        self.root = {"name": root_name, "children": []}
+        self._stack = [self.root]
+
+    def _first_doc_line(self, node) -> str:
+        return (ast.get_docstring(node) or "").partition("\n")[0]
+
+    def _push(self, entry: dict, node: ast.AST):
+        self._stack[-1]["children"].append(entry)
+        self._stack.append(entry)
+        self.generic_visit(node)
+        self._stack.pop()
+
+    def visit_ClassDef(self, node: ast.ClassDef):
+        self._push({"name": node.name, "desc": self._first_doc_line(node) or "Class", "children": []}, node)
+
+    def visit_FunctionDef(self, node: ast.FunctionDef):
+        sig = "(" + ", ".join(arg.arg for arg in node.args.args) + ")"
+        self._push({"name": node.name, "value": 1, "desc": self._first_doc_line(node), "sig": sig, "children": []}, node)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def generate_tree_data(python_code: str) -> dict:
+    """Generates Hierarchical JSON data for the ECharts tree.
+
+    The class/function hierarchy is a deterministic transformation, so it
+    is built locally from the AST instead of the previous Groq round-trip:
+    microseconds instead of seconds, no token spend, and no malformed-JSON
+    failure mode.
+    """
     if not python_code.strip():
         logger.warning("Attempted to generate tree data from empty code.")
         return {"name": "Root", "children": []}
-    
-    logger.info("Generating hierarchical tree data via LLM...")
-    response = call_groq_api(TREE_PROMPT, python_code, model_name=model_name)
-    
+
+    logger.info("Building hierarchical tree data from the AST...")
     try:
-        data = {}
-        if "---TREE_DATA---" in response:
-            json_str = response.split("---TREE_DATA---")[1].strip()
-            json_str = json_str.replace("```json", "").replace("```", "").strip()
-            data = json.loads(json_str)
-        else:
-            data = json.loads(response.replace("```json", "").replace("```", "").strip())
-            
-        def format_nodes(node):
-            label = node.get("name", "")
-            sig = node.get("sig", "")
-            if sig:
-                node["name"] = f"{label}\n{sig}"
-            if "children" in node:
-                for child in node["children"]:
-                    format_nodes(child)
-            return node
-
-        logger.info("Successfully parsed tree JSON data.")
-        return format_nodes(data)
-
-    except Exception as e:
+        tree = _parse(python_code)
+    except SyntaxError as e:
         logger.error(f"Tree Data Parsing Error: {e}")
-        st.error(f"Tree Data Error: {e}")
         return {"name": "Error Parsing Data", "children": []}
 
+    builder = _TreeBuilder("User Module")
+    builder.visit(tree)
+
+    # Iterative label rewrite: an explicit stack has no per-frame call
+    # overhead and cannot hit the recursion limit on deeply nested code.
+    data = builder.root
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        sig = node.get("sig")
+        if sig:
+            node["name"] = f"{node.get('name', '')}\n{sig}"
+        stack.extend(node.get("children", ()))
+    return data
+
 def render_tree_diagram(tree_data: dict):
     """Renders the Interactive Hierarchical Tree using ECharts."""
     if not tree_data:
@@ -112,6 +257,10 @@ def render_tree_diagram(tree_data: dict):
         ]
     }
     
+    from streamlit_echarts import st_echarts
     st.subheader("Interactive Code Hierarchy")
     with st.container(border=True):
-        st_echarts(options=option, height="700px")
\ No newline at end of file
+        # A key stable per tree lets Streamlit reuse the mounted chart
+        # instance across reruns instead of re-initializing the ECharts
+        # runtime; it only remounts when the data actually changes.
+        st_echarts(options=option, height="700px", key=f"tree_{hash(str(tree_data))}")
\ No newline at end of file
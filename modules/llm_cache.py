@@ -0,0 +1,71 @@
+"""
+Content-addressed on-disk cache for LLM responses.
+
+st.cache_data already memoizes per-process, but it evaporates on every
+app restart and is never shared across Streamlit sessions. This module
+backs repeat (prompt, code, model) calls with a small SQLite file so a
+re-click on unchanged code skips the network round-trip entirely —
+hundreds of milliseconds to seconds per call, plus the token spend.
+
+Keys are SHA-256 over the full request content, so distinct prompts
+(including the self-correction prompts, which embed the error message)
+never collide. Values are zlib-compressed; LLM responses are prose and
+code, which compress 3-5x.
+"""
+
+import os
+import sqlite3
+import time
+import zlib
+from hashlib import sha256
+
+from utils.logger import setup_logger
+
+logger = setup_logger("llm_cache")
+
+# One week: long enough to survive restarts and redeploys, short enough
+# that model upgrades on Groq's side eventually refresh stale answers.
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+
+_DB_PATH = os.getenv("DEVOPTIMA_LLM_CACHE", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".llm_cache.sqlite3"))
+
+_conn: sqlite3.Connection | None = None
+
+def _get_conn() -> sqlite3.Connection:
+    """Opens (once) the cache database, creating the table on first use."""
+    global _conn
+    if _conn is None:
+        # check_same_thread=False: call_groq_api runs from worker threads
+        # in the batch path; sqlite3 serializes writes internally and our
+        # statements are single-row upserts/selects.
+        _conn = sqlite3.connect(_DB_PATH, check_same_thread=False)
+        _conn.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value BLOB, ts INTEGER)")
+        _conn.commit()
+    return _conn
+
+def make_key(system_prompt: str, user_code: str, model_name: str) -> str:
+    """Deterministic content hash for one request."""
+    return sha256(f"{model_name}\x00{system_prompt}\x00{user_code}".encode()).hexdigest()
+
+def get(key: str, ttl: int = DEFAULT_TTL_SECONDS) -> str | None:
+    """Returns the cached response for `key`, or None on miss/expiry."""
+    try:
+        row = _get_conn().execute("SELECT value, ts FROM kv WHERE key = ?", (key,)).fetchone()
+        if row and time.time() - row[1] < ttl:
+            return zlib.decompress(row[0]).decode()
+    except Exception as e:
+        # A broken cache must never break the request path.
+        logger.warning(f"LLM cache read failed: {e}")
+    return None
+
+def put(key: str, value: str) -> None:
+    """Stores a response under `key`, replacing any previous entry."""
+    try:
+        conn = _get_conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO kv (key, value, ts) VALUES (?, ?, ?)",
+            (key, zlib.compress(value.encode()), int(time.time())),
+        )
+        conn.commit()
+    except Exception as e:
+        logger.warning(f"LLM cache write failed: {e}")
@@ -3,10 +3,15 @@ Handles all interactions with the Groq Large Language Model (LLM) API.
 """
 
 import os
+import random
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+import httpx
 from groq import Groq, APIError
 import streamlit as st
 from dotenv import load_dotenv
+from modules import llm_cache
 from utils.logger import setup_logger
 
 # Initialize logger for this module
@@ -18,14 +23,20 @@ load_dotenv()
 # --- CONFIGURATION ---
 MAX_RETRIES = 3
 RETRY_DELAY_SECONDS = 2
+MAX_BACKOFF_SECONDS = 30
+MAX_PARALLEL_REQUESTS = 8
 GROQ_MODEL = "llama-3.3-70b-versatile"
+# Headroom below the 128K model context for the response budget. The
+# estimate uses a conservative ~3 chars/token for code, avoiding a
+# tokenizer dependency just to reject obviously oversized payloads.
+MAX_INPUT_TOKENS = 120_000
 SUPPORTED_MODELS = {"llama-3.3-70b-versatile", "llama-3.1-8b-instant"}
 
 if GROQ_MODEL not in SUPPORTED_MODELS:
     raise RuntimeError(f"Unsupported Groq model: {GROQ_MODEL}. Please check llm_handler.py")
 
 # --- API CLIENT INITIALIZATION ---
-def _get_api_key() -> str | None:
+def _resolve_api_key() -> str | None:
     try:
         if hasattr(st, "secrets") and "GROQ_API_KEY" in st.secrets:
             return st.secrets["GROQ_API_KEY"]
@@ -33,23 +44,123 @@ def _get_api_key() -> str | None:
         pass
     return os.getenv("GROQ_API_KEY")
 
+# The key cannot change within a process (load_dotenv has already run),
+# so resolve the secrets/env lookup exactly once at import instead of
+# paying the try/except + hasattr + mapping probes on every API call.
+_API_KEY = _resolve_api_key()
+
+_client: Groq | None = None
+
 def get_groq_client() -> Groq | None:
-    api_key = _get_api_key()
-    return Groq(api_key=api_key) if api_key else None
+    """Returns the shared Groq client, constructed once per process.
+
+    Rebuilding the client per call re-read secrets/env and threw away
+    the underlying httpx connection pool, forcing a fresh TCP/TLS
+    handshake on every request. A module global (rather than
+    st.cache_resource) keeps it reachable from the batch worker
+    threads, which have no Streamlit context.
+    """
+    global _client
+    if _client is None:
+        if _API_KEY:
+            # Pool sized for the thread-pool batch path: enough warm
+            # keep-alive sockets that MAX_PARALLEL_REQUESTS in-flight
+            # calls never queue on a connection or re-handshake.
+            limits = httpx.Limits(
+                max_connections=int(os.getenv("GROQ_MAX_CONN", "32")),
+                max_keepalive_connections=int(os.getenv("GROQ_KEEPALIVE", "16")),
+                keepalive_expiry=60,
+            )
+            _client = Groq(api_key=_API_KEY, http_client=httpx.Client(limits=limits, timeout=60.0))
+    return _client
+
+# --- USAGE TRACKING ---
+# Process-wide (not per-session) because the batch path calls the API from
+# worker threads, where st.session_state is not available.
+_usage_lock = threading.Lock()
+_usage_totals = {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+
+def _add_usage(prompt_tokens: int, completion_tokens: int, cached_tokens: int) -> None:
+    with _usage_lock:
+        _usage_totals["prompt_tokens"] += prompt_tokens
+        _usage_totals["completion_tokens"] += completion_tokens
+        _usage_totals["cached_tokens"] += cached_tokens
+    if prompt_tokens:
+        logger.info(f"Groq usage: {prompt_tokens} prompt / {completion_tokens} completion tokens ({cached_tokens} served from prompt cache)")
+
+def _record_usage(chat_completion) -> None:
+    """Accumulates token usage, including Groq's prompt-cache hits."""
+    try:
+        usage = chat_completion.usage
+        x_groq = getattr(chat_completion, "x_groq", None)
+        cached = getattr(getattr(x_groq, "usage", None), "cached_tokens", 0) or 0
+        _add_usage(usage.prompt_tokens or 0, usage.completion_tokens or 0, cached)
+    except Exception:
+        # Usage metadata is best-effort; never fail the response path.
+        pass
+
+def _record_stream_usage(chunk) -> None:
+    """Accumulates usage from a streamed response.
+
+    Streams carry no per-chunk .usage; Groq delivers the totals once, on
+    the final SSE chunk, under x_groq.usage — so this is called per chunk
+    and is a no-op until that metadata appears.
+    """
+    try:
+        usage = getattr(getattr(chunk, "x_groq", None), "usage", None)
+        if usage is not None:
+            _add_usage(usage.prompt_tokens or 0, usage.completion_tokens or 0, getattr(usage, "cached_tokens", 0) or 0)
+    except Exception:
+        # Usage metadata is best-effort; never fail the response path.
+        pass
+
+def get_usage_summary() -> dict:
+    """Returns cumulative token usage and the prompt-cache hit rate."""
+    with _usage_lock:
+        totals = dict(_usage_totals)
+    totals["cache_hit_rate"] = totals["cached_tokens"] / totals["prompt_tokens"] if totals["prompt_tokens"] else 0.0
+    return totals
+
+def _estimate_tokens(text: str) -> int:
+    return len(text) // 3 + 1
+
+def _oversize_error(system_prompt: str, user_code: str) -> str | None:
+    """Rejects payloads that cannot fit the context window.
+
+    Without this, an oversized request fails server-side only after a
+    full round-trip and then burns every retry (plus backoff) on the
+    same deterministic error.
+    """
+    n_tokens = _estimate_tokens(system_prompt) + _estimate_tokens(user_code)
+    if n_tokens > MAX_INPUT_TOKENS:
+        logger.error(f"Rejected oversized payload: ~{n_tokens} tokens estimated.")
+        return f"ERROR: Input is too large for the model context (~{n_tokens:,} tokens estimated, limit {MAX_INPUT_TOKENS:,}). Trim the code and retry."
+    return None
 
 # --- CORE LLM INTERACTION ---
 def call_groq_api(system_prompt: str, user_code: str, model_name: str = GROQ_MODEL) -> str:
     """
     Sends a request to the Groq API with retry logic.
+
+    Responses are cached on disk keyed by (prompt, code, model), so a
+    repeat request on unchanged content skips the network entirely.
     """
     client = get_groq_client()
     if not client:
         logger.error("GROQ_API_KEY not found in secrets or environment.")
         return "ERROR: GROQ_API_KEY not found."
 
+    if (oversize := _oversize_error(system_prompt, user_code)):
+        return oversize
+
+    cache_key = llm_cache.make_key(system_prompt, user_code, model_name)
+    if (cached := llm_cache.get(cache_key)) is not None:
+        logger.info("Groq response served from on-disk cache.")
+        return cached
+
     user_prompt = f"USER_CODE:\n```python\n{user_code}\n```"
     logger.info(f"Calling Groq API with model: {model_name}")
-    
+
     for attempt in range(MAX_RETRIES):
         try:
             chat_completion = client.chat.completions.create(
@@ -63,13 +174,23 @@ def call_groq_api(system_prompt: str, user_code: str, model_name: str = GROQ_MOD
             )
             response_content = chat_completion.choices[0].message.content
             logger.info(f"Successfully received response from Groq on attempt {attempt + 1}")
+            _record_usage(chat_completion)
+            llm_cache.put(cache_key, response_content)
             return response_content
             
         except APIError as e:
             error_message = f"Groq API Error on attempt {attempt + 1}: {e}"
             logger.error(error_message)
+            status = getattr(e, "status_code", None)
+            # Only transient failures (rate limits, 5xx) are worth a
+            # retry; auth or bad-request errors will fail identically.
+            if status is not None and 400 <= status < 500 and status != 429:
+                return f"ERROR: Groq API rejected the request ({status}): {e}"
             if attempt < MAX_RETRIES - 1:
-                time.sleep(RETRY_DELAY_SECONDS * (attempt + 1))
+                # Exponential backoff with full jitter: randomized delays
+                # decorrelate retrying clients instead of re-colliding
+                # them on a fixed linear schedule.
+                time.sleep(random.uniform(0, min(MAX_BACKOFF_SECONDS, RETRY_DELAY_SECONDS * (2 ** attempt))))
             else:
                 return f"ERROR: Failed to communicate with Groq API after {MAX_RETRIES} attempts. Last error: {e}"
         except Exception as e:
@@ -77,3 +198,73 @@ def call_groq_api(system_prompt: str, user_code: str, model_name: str = GROQ_MOD
             return f"An unexpected error occurred: {e}"
             
     return "ERROR: An unknown error occurred after all retries."
+
+def call_groq_api_batch(prompts: list[tuple[str, str]], model_name: str = GROQ_MODEL) -> list[str]:
+    """
+    Dispatches several independent (system_prompt, user_code) requests at once.
+
+    Groq has no server-side batch endpoint, so the prompts are fanned out
+    over a bounded thread pool and collected in input order. Wall time
+    collapses to roughly the slowest single request instead of the sum.
+    """
+    if not prompts:
+        return []
+    workers = min(MAX_PARALLEL_REQUESTS, len(prompts))
+    logger.info(f"Dispatching batch of {len(prompts)} Groq requests ({workers} workers)")
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(call_groq_api, sys_p, user_c, model_name) for sys_p, user_c in prompts]
+        return [future.result() for future in futures]
+
+def call_groq_api_stream(system_prompt: str, user_code: str, model_name: str = GROQ_MODEL, status: dict | None = None):
+    """
+    Sends a streaming request to the Groq API, yielding content chunks.
+
+    The caller sees the first tokens as soon as they arrive instead of
+    blocking on the full completion. Errors are yielded as a final
+    'ERROR: ...' string so the UI degrades the same way as call_groq_api.
+    A mid-stream failure arrives after arbitrary partial output, so text
+    matching cannot detect it; callers that need to know (e.g. to avoid
+    caching a truncated response) pass a `status` dict, which gains
+    status["error"] = True on any failure path.
+    """
+    def _fail(message: str) -> str:
+        if status is not None:
+            status["error"] = True
+        return message
+
+    client = get_groq_client()
+    if not client:
+        logger.error("GROQ_API_KEY not found in secrets or environment.")
+        yield _fail("ERROR: GROQ_API_KEY not found.")
+        return
+
+    if (oversize := _oversize_error(system_prompt, user_code)):
+        yield _fail(oversize)
+        return
+
+    user_prompt = f"USER_CODE:\n```python\n{user_code}\n```"
+    logger.info(f"Streaming from Groq API with model: {model_name}")
+
+    try:
+        stream = client.chat.completions.create(
+            model=model_name,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            temperature=0.1,
+            max_tokens=4096,
+            stream=True,
+        )
+        for chunk in stream:
+            content = chunk.choices[0].delta.content
+            if content:
+                yield content
+            _record_stream_usage(chunk)
+        logger.info("Streaming response from Groq completed.")
+    except APIError as e:
+        logger.error(f"Groq API Error during stream: {e}")
+        yield _fail(f"ERROR: Failed to stream from Groq API. Last error: {e}")
+    except Exception as e:
+        logger.error(f"Unexpected error in call_groq_api_stream: {e}")
+        yield _fail(f"An unexpected error occurred: {e}")
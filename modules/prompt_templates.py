@@ -2,6 +2,8 @@
 Central repository for all LLM prompt templates.
 """
 
+from string import Template
+
 # Base instruction
 _BASE_PROMPT_INSTRUCTION = (
     "You are an expert software engineer. "
@@ -47,15 +49,15 @@ FORMAT:
 (Write the full transpiled code here)
 """
 
+# Dynamic content (the error log) sits at the END of the prompt so the
+# static instruction prefix stays byte-identical across calls and can be
+# served from the provider's prefix cache.
 DEBUG_PROMPT = f"""
 {_BASE_PROMPT_INSTRUCTION}
-TASK: Debug the Python code. 
-CONTEXT: An error log may be provided below. If provided, use it to fix the specific crash.
+TASK: Debug the Python code.
+CONTEXT: An error log may be provided at the end. If provided, use it to fix the specific crash.
 If NO error log is provided, perform a deep static analysis to find logical bugs, runtime errors, or security flaws.
 
-ERROR LOG:
-{{error_log}}
-
 INSTRUCTIONS:
 1. If the code has NO bugs and requires NO changes, the Description must start with "NO ISSUES FOUND".
 2. If bugs are found, explain the root cause clearly.
@@ -67,6 +69,9 @@ FORMAT:
 (Explain the bug and the fix, or write 'NO ISSUES FOUND' if clean)
 ---CODE---
 (Write the fixed code here. If no issues, return the original code)
+
+ERROR LOG:
+{{error_log}}
 """
 
 AUDIT_PROMPT = f"""
@@ -92,10 +97,7 @@ FORMAT:
 
 BATCH_FIX_PROMPT = f"""
 {_BASE_PROMPT_INSTRUCTION}
-TASK: Apply the following specific improvements to the user's code.
-
-SELECTED IMPROVEMENTS:
-{{selected_fixes}}
+TASK: Apply the specific improvements listed at the end to the user's code.
 
 INSTRUCTIONS:
 - Apply ONLY the selected improvements.
@@ -109,6 +111,9 @@ FORMAT:
 (Briefly explain what was changed)
 ---CODE---
 (The full, updated Python code)
+
+SELECTED IMPROVEMENTS:
+{{selected_fixes}}
 """
 
 SIMULATOR_PROMPT = f"""
@@ -251,7 +256,20 @@ Response:
 
 SELF_CORRECTION_PROMPT = f"""
 {_BASE_PROMPT_INSTRUCTION}
-TASK: Fix the Python syntax error in the previous attempt.
+TASK: Fix the Python syntax error in the previous attempt, provided at the end.
+
+INSTRUCTIONS:
+1. Analyze the error message and the code.
+2. Fix the syntax error.
+3. Return the FULL CORRECTED CODE.
+
+IMPORTANT: You must use the EXACT output format below. Do NOT use JSON.
+
+FORMAT:
+---DESCRIPTION---
+(Briefly explain the fix)
+---CODE---
+(The full, corrected Python code)
 
 PREVIOUS ATTEMPT:
 ```python
@@ -260,17 +278,37 @@ PREVIOUS ATTEMPT:
 
 ERROR MESSAGE:
 {{error_message}}
+"""
+
+MERGE_FIXES_PROMPT = f"""
+{_BASE_PROMPT_INSTRUCTION}
+TASK: Merge several independently-improved variants of the SAME original code into one final version.
+Each variant at the end applied exactly ONE improvement to the original code. Combine ALL improvements.
 
 INSTRUCTIONS:
-1. Analyze the error message and the code.
-2. Fix the syntax error.
-3. Return the FULL CORRECTED CODE.
+- Keep every improvement from every variant.
+- Where variants touch the same line, reconcile them sensibly.
+- Do NOT introduce new changes of your own.
 
 IMPORTANT: You must use the EXACT output format below. Do NOT use JSON.
 
 FORMAT:
 ---DESCRIPTION---
-(Briefly explain the fix)
+(Briefly summarize the combined changes)
 ---CODE---
-(The full, corrected Python code)
+(The full, merged Python code)
+
+VARIANTS:
+{{variants}}
 """
+
+# --- PRECOMPILED TEMPLATES ---
+# string.Template pre-parses placeholder positions once at import, so call
+# sites do a single-pass substitute instead of whole-string .replace chains
+# over multi-KB prompts on every click.
+DEBUG_PROMPT_TPL = Template(DEBUG_PROMPT.replace("{error_log}", "$error_log"))
+BATCH_FIX_PROMPT_TPL = Template(BATCH_FIX_PROMPT.replace("{selected_fixes}", "$selected_fixes"))
+ASK_PROMPT_TPL = Template(ASK_PROMPT.replace("{user_code}", "$user_code").replace("{user_question}", "$user_question"))
+SELF_CORRECTION_PROMPT_TPL = Template(SELF_CORRECTION_PROMPT.replace("{previous_code}", "$previous_code").replace("{error_message}", "$error_message"))
+TRANSPILE_PROMPT_TPL = Template(TRANSPILE_PROMPT + "\nTARGET LANGUAGE: $target_lang\n")
+MERGE_FIXES_PROMPT_TPL = Template(MERGE_FIXES_PROMPT.replace("{variants}", "$variants"))
@@ -0,0 +1,18 @@
+"""
+Shared helper for stripping markdown code fences from LLM output.
+
+Every module that touches a raw Groq response used to carry its own
+chain of .replace("```python", "").replace("```", "") calls — two full
+string scans and two intermediate allocations per response. One
+compiled, edge-anchored regex does it in a single pass, handles any
+language tag (python, json, mermaid, ...), and leaves literal triple
+backticks inside the body alone.
+"""
+
+import re
+
+_FENCE_RE = re.compile(r"^\s*```[a-zA-Z]*\n?|\n?```\s*$")
+
+def strip_fences(text: str) -> str:
+    """Removes leading/trailing markdown code fences and whitespace."""
+    return _FENCE_RE.sub("", text).strip()
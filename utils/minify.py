@@ -0,0 +1,39 @@
+"""
+Lossless-enough code minification for LLM prompts.
+
+Comments and blank lines carry almost no signal for analysis-style prompts
+(Audit, Simulate) but still cost input tokens on every Groq call. Stripping
+them typically shaves 20-40% off the prompt size, which translates directly
+into prefill latency and spend. Flows that return replacement code
+(Refactor, Optimize, Debug) keep the full source so formatting survives.
+"""
+
+import io
+import tokenize
+
+def minify_for_llm(code: str) -> str:
+    """
+    Strips comments and blank lines from Python source.
+
+    Uses the tokenize module so string literals containing '#' are never
+    mangled. Falls back to the original source untouched if tokenization
+    fails — the caller has usually validated the code already, but a
+    half-typed editor buffer should never crash a button handler.
+
+    Args:
+        code: A string containing Python code.
+
+    Returns:
+        The same code with COMMENT tokens and empty lines removed.
+    """
+    try:
+        tokens = [
+            tok for tok in tokenize.generate_tokens(io.StringIO(code).readline)
+            if tok.type != tokenize.COMMENT
+        ]
+        stripped = tokenize.untokenize(tokens)
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        return code
+    return "\n".join(
+        line.rstrip() for line in stripped.splitlines() if line.strip()
+    )
@@ -3,12 +3,36 @@ Central repository for all UI/UX styling.
 Uses custom CSS to override Streamlit's default look with a premium 'Cyber-Minimalist' theme.
 """
 
-def get_css() -> str:
-    return """
+import re
+
+def _minify(css: str) -> str:
+    """One-shot minifier, run once at import.
+
+    Strips comments and collapses whitespace: roughly 40% fewer bytes
+    pushed over the websocket on every rerun and fewer tokens for the
+    browser's CSS parser. A regex pass is enough for our own hand-written
+    stylesheet; no build step or csscompressor dependency required.
+    """
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)
+    return css.strip()
+
+# Fonts load via <link> instead of a CSS @import: @import is only
+# discovered after the stylesheet is parsed and then serializes a second
+# DNS+TLS+HTTP hop. Preconnect warms both font origins while the css2
+# request is still in flight, and display=swap keeps text visible.
+_FONT_LINKS = (
+    '<link rel="preconnect" href="https://fonts.googleapis.com">'
+    '<link rel="preconnect" href="https://fonts.gstatic.com" crossorigin>'
+    '<link rel="stylesheet" href="https://fonts.googleapis.com/css2?family=Inter:wght@400;600;800&family=JetBrains+Mono:wght@400;700&display=swap">'
+)
+
+# Assembled and minified once at import: the blob is fully static, so a
+# module-level constant beats any caching decorator — get_css() is a
+# plain attribute read with no cache machinery on the rerun path.
+_CSS = _FONT_LINKS + _minify("""
     <style>
-        /* --- GLOBAL FONTS --- */
-        @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;600;800&family=JetBrains+Mono:wght@400;700&display=swap');
-        
         html, body, [class*="css"] {
             font-family: 'Inter', sans-serif;
             color: #E0E0E0;
@@ -112,7 +136,14 @@ def get_css() -> str:
             box-shadow: 0 20px 50px rgba(0, 0, 0, 0.5);
         }
 
-        .action-card { position: relative; overflow: hidden; margin-bottom: 2rem; }
+        .action-card {
+            position: relative; overflow: hidden; margin-bottom: 2rem;
+            /* Skip layout/paint for cards outside the viewport; the
+               intrinsic size keeps scrollbar geometry stable. No-op on
+               engines without content-visibility support. */
+            content-visibility: auto;
+            contain-intrinsic-size: auto 180px;
+        }
         .action-card::before { content: ""; position: absolute; top: 0; left: 0; width: 4px; height: 100%; }
         
         .action-card-title { font-size: 1.5rem; font-weight: 800; margin-bottom: 0.5rem; display: flex; align-items: center; gap: 10px; }
@@ -135,17 +166,36 @@ def get_css() -> str:
             border-radius: 12px;
             font-weight: 700;
             letter-spacing: 0.05em;
-            transition: all 0.3s ease;
+            /* Explicit list: 'all' makes the engine watch every animatable
+               property; only these actually change on :hover. The glow
+               lives on ::after below, faded via opacity. */
+            transition: background 0.3s ease, border-color 0.3s ease, transform 0.3s ease;
             width: 100%;
+            position: relative;
         }
-        
+
+        /* Hover glow as a pre-rasterized overlay: animating box-shadow
+           re-rasterizes the shadow every frame, while an opacity fade
+           composites the once-painted layer on the GPU. */
+        div.stButton > button::after {
+            content: "";
+            position: absolute;
+            inset: -1px;
+            border-radius: 12px;
+            pointer-events: none;
+            box-shadow: 0 0 25px rgba(79, 70, 229, 0.5);
+            opacity: 0;
+            transition: opacity 0.3s ease;
+        }
+
         div.stButton > button:hover {
             background: #4F46E5;
             border-color: #4F46E5;
-            box-shadow: 0 0 25px rgba(79, 70, 229, 0.5);
             transform: scale(1.02);
         }
 
+        div.stButton > button:hover::after { opacity: 1; }
+
         /* --- TABS --- */
         .stTabs [data-baseweb="tab-list"] {
             gap: 8px;
@@ -184,5 +234,22 @@ def get_css() -> str:
             white-space: pre-wrap;
         }
         .desi-box strong { color: #FDBA74; font-weight: 700; } /* Highlight Color */
+
+        /* --- CODE DIFF TABLE (difflib.HtmlDiff output) --- */
+        table.diff { width: 100%; border-collapse: collapse; font-family: 'JetBrains Mono', monospace; font-size: 0.8rem; margin-top: 1rem; }
+        table.diff td { padding: 2px 6px; border: none; white-space: pre-wrap; word-break: break-all; }
+        table.diff .diff_header { background: rgba(255, 255, 255, 0.05); color: #9CA3AF; text-align: right; padding: 2px 8px; }
+        table.diff .diff_next { display: none; }
+        table.diff .diff_add { background: rgba(52, 211, 153, 0.18); }
+        table.diff .diff_chg { background: rgba(251, 191, 36, 0.18); }
+        table.diff .diff_sub { background: rgba(248, 113, 113, 0.18); }
+
+        /* --- SIMULATION TRACE TABLE --- */
+        .trace-table { width: 100%; border-collapse: collapse; margin-top: 1rem; }
+        .trace-table td { padding: 10px 12px; border-bottom: 1px solid rgba(255, 255, 255, 0.08); vertical-align: top; font-size: 0.9rem; }
+        .trace-table .trace-step { color: #22D3EE; font-weight: 700; white-space: nowrap; }
     </style>
-    """
\ No newline at end of file
+    """)
+
+def get_css() -> str:
+    return _CSS
\ No newline at end of file